@@ -1,16 +1,30 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from fastapi.responses import FileResponse, JSONResponse
-import google.generativeai as genai
+from fastapi.responses import FileResponse, JSONResponse, Response
 import os
 import uvicorn
 import json
 import database  # Our local DB module
+import gemini_client  # Shared Gemini config/model registry
 import asyncio
+from contextlib import asynccontextmanager
+import hashlib
+import math
+import re
+import numpy as np
+import orjson
+from cachetools import TTLCache
+from numba import njit
 
 # --- Configuration ---
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema setup runs once per worker process, not as an import side effect
+    database.init_db()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,17 +35,16 @@ app.add_middleware(
 )
 
 # Configure Gemini
-api_key = os.environ.get("GOOGLE_API_KEY")
-if api_key:
-    genai.configure(api_key=api_key)
-
-generation_config = {
-  "temperature": 1,
-  "top_p": 0.95,
-  "top_k": 64,
-  "max_output_tokens": 8192,
-  "response_mime_type": "text/plain",
-}
+gemini_client.configure()
+
+# Response cache for identical Gemini prompts (users re-run the same ticker while tweaking weights).
+# Opt-in per call: only deterministic-ish extraction prompts use it, never chat.
+_response_cache = TTLCache(maxsize=512, ttl=3600)
+_response_cache_lock = asyncio.Lock()
+# Futures for Gemini calls still in flight, so duplicate prompts wait on the first call
+# (resolved with _LEADER_CANCELLED if the first caller is cancelled before Gemini answers)
+_inflight: dict[bytes, asyncio.Future] = {}
+_LEADER_CANCELLED = object()
 
 # --- Pydantic Models ---
 class ChatRequest(BaseModel):
@@ -69,23 +82,43 @@ class WeightRequest(BaseModel):
     project_name: str
     target_return: float
 
+class BatchScoreRequest(BaseModel):
+    # Column-oriented: one list per metric key (see METRIC_COLUMNS), all the same length
+    metrics: dict[str, list[float]]
+    weights: dict
+    target_return: float
+
+class PortfolioRequest(BaseModel):
+    symbols: list[str]
+
+class StockReportRequest(BaseModel):
+    symbol: str
+    weights: dict = {}
+    target_return: float
+    portfolio_summary: str | None = None
+
 # --- AI Helper Function (Async) ---
-def _call_gemini_sync(prompt: str, system_instruction: str = "", json_mode: bool = False) -> str:
-    """Synchronous Gemini call to be run in threadpool"""
+async def _generate(prompt: str, system_instruction: str, json_mode: bool, key: bytes, cache: bool) -> str | None:
+    """Native async Gemini call so the event loop never blocks on a worker thread; None if Gemini failed"""
     try:
-        config = generation_config.copy()
-        if json_mode:
-            config["response_mime_type"] = "application/json"
-        
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            generation_config=config,
-            system_instruction=system_instruction,
-        )
-        response = model.generate_content(prompt)
-        return response.text
+        text = await gemini_client.call(prompt, system_instruction, json_mode)
     except Exception as e:
         print(f"Gemini Error: {e}")
+        return None
+    # Only real answers are cached; failures must not stick for an hour
+    if cache:
+        async with _response_cache_lock:
+            _response_cache[key] = text
+    return text
+
+async def call_gemini(prompt: str, system_instruction: str = "", json_mode: bool = False, cache: bool = False,
+                      fallback: bool = True) -> str | None:
+    """
+    Coalesced entry point for every Gemini request; `cache=True` also reuses answers for an hour.
+    If Gemini fails, returns a canned reply, or None when the caller passes `fallback=False`.
+    """
+    text = await _coalesced_generate(prompt, system_instruction, json_mode, cache)
+    if text is None and fallback:
         if json_mode:
             # Mock fallback
             return json.dumps({
@@ -95,118 +128,121 @@ def _call_gemini_sync(prompt: str, system_instruction: str = "", json_mode: bool
                 "industry": 20, "profit": 20, "mos": 20, "yield_val": 20, "competition": 20
             })
         return "I'm having trouble connecting to my brain right now. Please check the API Key."
-
-async def call_gemini(prompt: str, system_instruction: str = "", json_mode: bool = False) -> str:
-    """Async wrapper primarily to prevent blocking event loop"""
-    return await asyncio.to_thread(_call_gemini_sync, prompt, system_instruction, json_mode)
+    return text
+
+async def _coalesced_generate(prompt: str, system_instruction: str, json_mode: bool, cache: bool) -> str | None:
+    key = hashlib.sha1(f"{prompt}\0{system_instruction}\0{json_mode}".encode()).digest()
+    if cache:
+        async with _response_cache_lock:
+            cached = _response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    # An identical prompt is already on its way to Gemini, share its answer (or its failure).
+    # _LEADER_CANCELLED means that leader gave up, so the next waiter takes over the call itself.
+    while key in _inflight:
+        text = await asyncio.shield(_inflight[key])
+        if text is not _LEADER_CANCELLED:
+            return text
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        text = await _generate(prompt, system_instruction, json_mode, key, cache)
+        fut.set_result(text)
+        return text
+    finally:
+        del _inflight[key]
+        if not fut.done():
+            # Leader was cancelled; wake followers so one of them retries. Resolving with a
+            # sentinel rather than cancelling keeps a follower's own CancelledError unambiguous.
+            fut.set_result(_LEADER_CANCELLED)
+
+def _parse_json_lenient(s: str):
+    """Parse Gemini JSON output, repairing markdown fences and trailing commas before giving up"""
+    s = s.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        return orjson.loads(re.sub(r",(\s*[}\]])", r"\1", s))
 
 # --- Core Business Logic (Backend) ---
-def calculate_master_score(metrics: dict, weights: dict, target_return: float):
+# Score buckets as sorted (threshold, score) pairs: a value earns the score of the
+# highest threshold it reaches. NaN reaches none of them and earns the lowest score, as it
+# did with the original >= chains; -inf stops at the -inf sentinel and +inf at the top.
+_IND_T, _IND_S = (-math.inf, 0.0, 10.0, 20.0), (0, 60, 80, 100)
+_PROF_T, _PROF_S = (-math.inf, 0.0, 5.0, 10.0, 20.0), (0, 40, 60, 80, 100)
+# "> 20% cheaper" is strict, so its threshold is the next float above 0.20
+_MOS_T, _MOS_S = (-math.inf, -0.10, 0.10, math.nextafter(0.20, math.inf)), (0, 50, 80, 100)
+_YIELD_T, _YIELD_S = (-math.inf, 3.0, 5.0, 8.0), (30, 60, 80, 100)
+_COMP_T, _COMP_S = (-math.inf, -5.0, 5.0, 15.0), (20, 50, 80, 100)
+
+@njit(cache=True)
+def _bucket(value, thresholds, scores):
+    if math.isnan(value):
+        return scores[0]
+    i = len(thresholds) - 1
+    while i > 0 and value < thresholds[i]:
+        i -= 1
+    return scores[i]
+
+def _bucket_vec(values, thresholds, scores):
+    """Array version of _bucket"""
+    idx = np.searchsorted(thresholds, values, side="right") - 1
+    return np.where(np.isnan(values), scores[0], np.take(scores, idx))
+
+@njit(cache=True)
+def _score_core(ind_growth, prof_growth, stock_pe, sect_pe, div_yield, div_years, comp_growth, beta,
+                w_ind, w_prof, w_mos, w_yield, w_comp, target_return):
     """
-    Master Scoring Model (0-100)
-    
-    Weights (Default):
-    - Industry Growth: 15%
-    - Net Profit Growth: 25%
-    - MOS (Valuation): 25%
-    - Dividend Yield: 20%
-    - Competitiveness: 15%
+    Numeric core of the Master Scoring Model, kept to plain floats so Numba can compile it.
+    Returns (base_score, final_score, risk_mult, industry, profit, mos, yield, competition).
     """
-    
-    # Check for missing keys and set safe defaults
-    m = {
-        "industry_growth_3yr": metrics.get("industry_growth_3yr", 0),
-        "net_profit_growth_5yr": metrics.get("net_profit_growth_5yr", 0),
-        "pe_ratio": metrics.get("pe_ratio", 0),
-        "sector_pe": metrics.get("sector_pe", 0),
-        "dividend_yield": metrics.get("dividend_yield", 0),
-        "dividend_years_consecutive": metrics.get("dividend_years_consecutive", 0),
-        "company_growth_rate": metrics.get("company_growth_rate", 0),
-        "beta": metrics.get("beta", 1.0)
-    }
-
-    raw_scores = {}
-
     # 1. Industry Growth (3yr CAGR)
-    ind_growth = m["industry_growth_3yr"]
-    if ind_growth >= 20: raw_scores["industry"] = 100
-    elif ind_growth >= 10: raw_scores["industry"] = 80
-    elif ind_growth >= 0: raw_scores["industry"] = 60
-    else: raw_scores["industry"] = 0
+    r_ind = _bucket(ind_growth, _IND_T, _IND_S)
 
     # 2. Net Profit Growth (5yr CAGR)
-    prof_growth = m["net_profit_growth_5yr"]
-    if prof_growth >= 20: raw_scores["profit"] = 100
-    elif prof_growth >= 10: raw_scores["profit"] = 80
-    elif prof_growth >= 5: raw_scores["profit"] = 60
-    elif prof_growth >= 0: raw_scores["profit"] = 40
-    else: raw_scores["profit"] = 0
+    r_prof = _bucket(prof_growth, _PROF_T, _PROF_S)
 
     # 3. MOS (Valuation)
     # Formula: (Sector PE - Stock PE) / Sector PE
     # If Sector PE is 0 or None, handle gracefully (assume not cheap)
-    stock_pe = m["pe_ratio"]
-    sect_pe = m["sector_pe"]
-    mos_score = 0
     if sect_pe > 0:
+        # > 20% Cheaper = 100, 10-20% Cheaper = 80, +/- 10% (Fair) = 50, More expensive = 0
         mos_pct = (sect_pe - stock_pe) / sect_pe
-        if mos_pct > 0.20: mos_score = 100      # > 20% Cheaper
-        elif mos_pct >= 0.10: mos_score = 80    # 10-20% Cheaper
-        elif mos_pct >= -0.10: mos_score = 50   # +/- 10% (Fair)
-        else: mos_score = 0                     # More expensive
+        r_mos = _bucket(mos_pct, _MOS_T, _MOS_S)
     else:
         # Fallback if no sector data: Assume Fair if PE is reasonable (<20), else 0
-        if stock_pe > 0 and stock_pe < 20: mos_score = 50
-        else: mos_score = 0
-    raw_scores["mos"] = mos_score
+        if stock_pe > 0 and stock_pe < 20: r_mos = 50
+        else: r_mos = 0
 
     # 4. Dividend Yield
     # CRITICAL: If consecutive years < 5, Score = 0
-    div_yield = m["dividend_yield"]
-    div_years = m["dividend_years_consecutive"]
-    
     if div_years < 5:
-        raw_scores["yield"] = 0
+        r_yield = 0
     else:
-        if div_yield >= 8: raw_scores["yield"] = 100
-        elif div_yield >= 5: raw_scores["yield"] = 80
-        elif div_yield >= 3: raw_scores["yield"] = 60
-        else: raw_scores["yield"] = 30
+        r_yield = _bucket(div_yield, _YIELD_T, _YIELD_S)
 
     # 5. Competitiveness (Company Growth vs Industry Growth)
     # Diff = Company Growth - Industry Growth
-    comp_growth = m["company_growth_rate"]
     # We compare comp_growth (Generic Company Growth) vs ind_growth (Industry Growth 3yr)
     # Or should we compare Net Profit Growth vs Industry Growth? 
     # The requirement says "Company Growth - Industry Growth". 
     # We will use 'company_growth_rate' extracted specifically for this.
-    
     diff = comp_growth - ind_growth
-    if diff >= 15: raw_scores["competition"] = 100
-    elif diff >= 5: raw_scores["competition"] = 80
-    elif diff >= -5: raw_scores["competition"] = 50
-    else: raw_scores["competition"] = 20
+    r_comp = _bucket(diff, _COMP_T, _COMP_S)
 
     # Step A: Base Score Calculation
     # Weights should be passed as integers (e.g. 15, 25...). We divide by 100.
-    w_ind = weights.get("industry", 15)
-    w_prof = weights.get("profit", 25)
-    w_mos = weights.get("mos", 25)
-    w_yield = weights.get("yield_val", 20)
-    w_comp = weights.get("competition", 15)
-    
     base_score = (
-        (raw_scores["industry"] * w_ind) +
-        (raw_scores["profit"] * w_prof) +
-        (raw_scores["mos"] * w_mos) +
-        (raw_scores["yield"] * w_yield) +
-        (raw_scores["competition"] * w_comp)
+        (r_ind * w_ind) +
+        (r_prof * w_prof) +
+        (r_mos * w_mos) +
+        (r_yield * w_yield) +
+        (r_comp * w_comp)
     ) / 100.0
 
     # Step B: Risk Multiplier Logic
-    beta = m["beta"]
-    risk_mult = 1.0
-    
     if target_return < 10: # Conservative
         if beta < 0.8: risk_mult = 1.0
         elif beta <= 1.2: risk_mult = 0.9
@@ -219,9 +255,46 @@ def calculate_master_score(metrics: dict, weights: dict, target_return: float):
         if beta >= 0.7 and beta <= 1.5: risk_mult = 1.0
         else: risk_mult = 0.8
 
-    # Step C: Final Grading
     final_score = base_score * risk_mult
-    
+    return base_score, final_score, risk_mult, r_ind, r_prof, r_mos, r_yield, r_comp
+
+# Metric keys in _score_core's positional order (also the batch scorer's column order)
+METRIC_COLUMNS = (
+    "industry_growth_3yr", "net_profit_growth_5yr", "pe_ratio", "sector_pe",
+    "dividend_yield", "dividend_years_consecutive", "company_growth_rate", "beta"
+)
+# Safe defaults for missing metrics, aligned with METRIC_COLUMNS
+_METRIC_DEFAULTS = (0, 0, 0, 0, 0, 0, 0, 1.0)
+
+def _metrics_tuple(metrics: dict) -> tuple:
+    # Spelled out rather than looped over METRIC_COLUMNS: this runs once per scored stock
+    return (
+        float(metrics.get("industry_growth_3yr", 0)),
+        float(metrics.get("net_profit_growth_5yr", 0)),
+        float(metrics.get("pe_ratio", 0)),
+        float(metrics.get("sector_pe", 0)),
+        float(metrics.get("dividend_yield", 0)),
+        float(metrics.get("dividend_years_consecutive", 0)),
+        float(metrics.get("company_growth_rate", 0)),
+        float(metrics.get("beta", 1.0)),
+    )
+
+def _weights_tuple(weights: dict) -> tuple:
+    return (
+        float(weights.get("industry", 15)),
+        float(weights.get("profit", 25)),
+        float(weights.get("mos", 25)),
+        float(weights.get("yield_val", 20)),
+        float(weights.get("competition", 15)),
+    )
+
+def _score_result(m: tuple, w: tuple, target_return: float):
+    """Score one stock from pre-built metric/weight tuples; the dict lookups happen once at the caller"""
+    base_score, final_score, risk_mult, r_ind, r_prof, r_mos, r_yield, r_comp = _score_core(
+        m[0], m[1], m[2], m[3], m[4], m[5], m[6], m[7], w[0], w[1], w[2], w[3], w[4], float(target_return)
+    )
+
+    # Step C: Final Grading
     grade = "C" # Default
     if final_score >= 80: grade = "A"
     elif final_score >= 60: grade = "B"
@@ -231,28 +304,237 @@ def calculate_master_score(metrics: dict, weights: dict, target_return: float):
         "finalScore": int(final_score),
         "grade": grade,
         "riskMult": risk_mult,
-        "rawScores": raw_scores
+        "rawScores": {
+            "industry": r_ind,
+            "profit": r_prof,
+            "mos": r_mos,
+            "yield": r_yield,
+            "competition": r_comp
+        }
+    }
+
+def calculate_master_score(metrics: dict, weights: dict, target_return: float):
+    """
+    Master Scoring Model (0-100)
+    
+    Weights (Default):
+    - Industry Growth: 15%
+    - Net Profit Growth: 25%
+    - MOS (Valuation): 25%
+    - Dividend Yield: 20%
+    - Competitiveness: 15%
+    """
+    
+    # Check for missing keys and set safe defaults
+    return _score_result(_metrics_tuple(metrics), _weights_tuple(weights), target_return)
+
+# Below this many stocks NumPy's fixed per-call overhead costs more than looping the compiled core
+_VECTORIZE_MIN_ROWS = 64
+
+def _score_rows_columnar(columns, weights: tuple, target_return: float):
+    """Small-batch path: run _score_core per row but return the same column layout as the vectorized path"""
+    w_ind, w_prof, w_mos, w_yield, w_comp = weights
+    target_return = float(target_return)
+    results = [
+        _score_core(float(a), float(b), float(c), float(d), float(e), float(f), float(g), float(h),
+                    w_ind, w_prof, w_mos, w_yield, w_comp, target_return)
+        for a, b, c, d, e, f, g, h in zip(*columns)
+    ]
+    base, final, risk, r_ind, r_prof, r_mos, r_yield, r_comp = map(list, zip(*results)) if results else ([],) * 8
+    return {
+        "baseScore": [round(b, 1) for b in base],
+        "finalScore": [int(f) for f in final],
+        "grade": ["A" if f >= 80 else "B" if f >= 60 else "C" for f in final],
+        "riskMult": risk,
+        "rawScores": {
+            "industry": r_ind,
+            "profit": r_prof,
+            "mos": r_mos,
+            "yield": r_yield,
+            "competition": r_comp
+        }
+    }
+
+def calculate_master_scores_batch(columns, weights: tuple, target_return: float):
+    """
+    Vectorized Master Scoring Model for N stocks at once.
+    `columns` holds 8 equal-length sequences in METRIC_COLUMNS order and `weights` is a tuple as
+    built by _weights_tuple. Results come back column-oriented (one list per field) so no per-row dicts are built.
+    """
+    if len(columns[0]) < _VECTORIZE_MIN_ROWS:
+        return _score_rows_columnar(columns, weights, target_return)
+
+    ind_growth, prof_growth, stock_pe, sect_pe, div_yield, div_years, comp_growth, beta = np.asarray(columns, dtype=np.float64)
+
+    raw_ind = _bucket_vec(ind_growth, _IND_T, _IND_S)
+    raw_prof = _bucket_vec(prof_growth, _PROF_T, _PROF_S)
+
+    has_sector = sect_pe > 0
+    with np.errstate(invalid="ignore"):  # inf/inf -> NaN, which _bucket_vec scores lowest
+        mos_pct = np.divide(sect_pe - stock_pe, sect_pe, out=np.zeros_like(sect_pe), where=has_sector)
+    raw_mos = np.where(
+        has_sector,
+        _bucket_vec(mos_pct, _MOS_T, _MOS_S),
+        np.where((stock_pe > 0) & (stock_pe < 20), 50, 0),
+    )
+
+    raw_yield = np.where(div_years < 5, 0, _bucket_vec(div_yield, _YIELD_T, _YIELD_S))
+
+    with np.errstate(invalid="ignore"):  # inf - inf -> NaN, as in the scalar core
+        diff = comp_growth - ind_growth
+    raw_comp = _bucket_vec(diff, _COMP_T, _COMP_S)
+
+    raw = np.column_stack([raw_ind, raw_prof, raw_mos, raw_yield, raw_comp])
+    base_scores = raw @ np.asarray(weights, dtype=np.float64) / 100.0
+
+    if target_return < 10: # Conservative
+        risk_mults = np.where(beta < 0.8, 1.0, np.where(beta <= 1.2, 0.9, 0.5))
+    elif target_return >= 15: # Aggressive
+        risk_mults = np.where((beta >= 1.2) & (beta <= 2.5), 1.0, np.where((beta >= 0.9) & (beta < 1.2), 0.9, 0.6))
+    else: # Moderate (10 - 14.99)
+        risk_mults = np.where((beta >= 0.7) & (beta <= 1.5), 1.0, 0.8)
+
+    final_scores = base_scores * risk_mults
+    grades = np.select([final_scores >= 80, final_scores >= 60], ["A", "B"], default="C")
+
+    return {
+        "baseScore": np.round(base_scores, 1).tolist(),
+        "finalScore": final_scores.astype(np.int64).tolist(),
+        "grade": grades.tolist(),
+        "riskMult": risk_mults.tolist(),
+        "rawScores": {
+            "industry": raw_ind.tolist(),
+            "profit": raw_prof.tolist(),
+            "mos": raw_mos.tolist(),
+            "yield": raw_yield.tolist(),
+            "competition": raw_comp.tolist()
+        }
     }
 
+# Mock Default on Error
+DEFAULT_METRICS = {
+    "industry_growth_3yr": 5.0, "net_profit_growth_5yr": 5.0,
+    "pe_ratio": 15.0, "sector_pe": 15.0,
+    "dividend_yield": 2.0, "dividend_years_consecutive": 5,
+    "company_growth_rate": 5.0, "beta": 1.0
+}
+
+# --- Prompt Templates ---
+# Built once at import; handlers only fill in the fields with str.format
+_ANALYZE_TPL = """
+    Analyze stock {symbol}. Extract these EXACT metrics (estimate if needed for Thai/Global context):
+    1. industry_growth_3yr (Float %)
+    2. net_profit_growth_5yr (Float %)
+    3. pe_ratio (Float)
+    4. sector_pe (Float) - Average PE of the sector
+    5. dividend_yield (Float %)
+    6. dividend_years_consecutive (Int) - How many years of continuous dividends?
+    7. company_growth_rate (Float %) - General revenue/growth rate
+    8. beta (Float)
+    
+    Return JSON only:
+    {{
+        "industry_growth_3yr": float, 
+        "net_profit_growth_5yr": float, 
+        "pe_ratio": float, 
+        "sector_pe": float,
+        "dividend_yield": float, 
+        "dividend_years_consecutive": int,
+        "company_growth_rate": float,
+        "beta": float
+    }}
+    """
+
+_WEIGHTS_TPL = """
+    Acting as Jomo (Investment Strategist), suggest the optimal weighting (Total 100%) for:
+    1. industry (Industry Growth)
+    2. profit (Net Profit Growth)
+    3. mos (Valuation/MOS)
+    4. yield_val (Dividend Yield)
+    5. competition (Competitiveness)
+
+    Context: Project Name "{project_name}", Target Return {target_return}%.
+    If the project implies dividends, boost yield. If growth, boost industry/profit.
+    
+    Return JSON only: {{"industry": int, "profit": int, "mos": int, "yield_val": int, "competition": int}}
+    """
+
+_VERDICT_TPL = """Acting as a senior investment analyst, write a concise 2-sentence verdict for {symbol}. 
+    Key Data: PE {pe_ratio} (Sector {sector_pe}), Yield {dividend_yield}%. 
+    The model scored it {score}/100 (Grade {grade}). 
+    Explain why it got this score based on the Master Scoring Model rules."""
+
+_STRATEGY_TPL = """Analyze this stock portfolio: [{portfolio_summary}]. 
+    Target Return is {target_return}%. 
+    Provide a summary of the portfolio's overall quality and 3 concise bullet points for optimization strategy."""
+
+_MULTI_ANALYZE_TPL = """
+    Analyze each of these stocks: {symbols}. For every symbol extract these EXACT metrics (estimate if needed for Thai/Global context):
+    1. industry_growth_3yr (Float %)
+    2. net_profit_growth_5yr (Float %)
+    3. pe_ratio (Float)
+    4. sector_pe (Float) - Average PE of the sector
+    5. dividend_yield (Float %)
+    6. dividend_years_consecutive (Int) - How many years of continuous dividends?
+    7. company_growth_rate (Float %) - General revenue/growth rate
+    8. beta (Float)
+    
+    Return JSON only, one object mapping each symbol (exactly as written above) to its metrics:
+    {{
+        "SYMBOL": {{
+            "industry_growth_3yr": float, 
+            "net_profit_growth_5yr": float, 
+            "pe_ratio": float, 
+            "sector_pe": float,
+            "dividend_yield": float, 
+            "dividend_years_consecutive": int,
+            "company_growth_rate": float,
+            "beta": float
+        }}
+    }}
+    """
+
+# Above this many tickers a single response risks truncation, so fall back to per-symbol calls
+MAX_BATCH_SYMBOLS = 20
+# Upper bound on per-symbol Gemini calls in flight at once, across all requests
+MAX_CONCURRENT_ANALYSES = 8
+_analysis_slots = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+
 # --- API Endpoints ---
 
+def _not_modified(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already covers `etag`"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return etag in tags or "*" in tags
+
 @app.get("/")
 async def read_root():
     return FileResponse("index.html")
 
 @app.get("/api/projects")
-async def get_projects():
-    return database.get_all_projects()
+async def get_projects(request: Request):
+    # The version counter moves on every save/delete, so polling clients skip the scan when nothing changed
+    etag = f'"{database.get_projects_version()}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(database.get_all_projects_raw(), media_type="application/json", headers={"ETag": etag})
+
+@app.get("/api/projects/summary")
+async def get_project_summaries(target_return: float | None = None) -> list:
+    return database.list_projects(target_return)
 
 @app.post("/api/projects")
 async def save_project(project: ProjectData):
-    # Fallback for Pydantic v1 vs v2
+    # Fallback for Pydantic v1 vs v2; v2 serializes straight to a JSON string
     try:
-        data = project.model_dump()
+        data_json = project.model_dump_json()
     except AttributeError:
-        data = project.dict()
+        data_json = project.json()
         
-    database.save_project(data)
+    database.save_project_raw(project.id, project.name, data_json)
     print(f"Saved project: {project.id} - {project.name}") 
     return {"status": "success"}
 
@@ -269,47 +551,81 @@ async def chat_jomo(req: ChatRequest):
     reply = await call_gemini(req.message, system_prompt)
     return {"reply": reply}
 
-@app.post("/api/analyze-stock")
-async def analyze_stock(req: StockAnalysisRequest):
-    prompt = f"""
-    Analyze stock {req.symbol}. Extract these EXACT metrics (estimate if needed for Thai/Global context):
-    1. industry_growth_3yr (Float %)
-    2. net_profit_growth_5yr (Float %)
-    3. pe_ratio (Float)
-    4. sector_pe (Float) - Average PE of the sector
-    5. dividend_yield (Float %)
-    6. dividend_years_consecutive (Int) - How many years of continuous dividends?
-    7. company_growth_rate (Float %) - General revenue/growth rate
-    8. beta (Float)
-    
-    Return JSON only:
-    {{
-        "industry_growth_3yr": float, 
-        "net_profit_growth_5yr": float, 
-        "pe_ratio": float, 
-        "sector_pe": float,
-        "dividend_yield": float, 
-        "dividend_years_consecutive": int,
-        "company_growth_rate": float,
-        "beta": float
-    }}
-    """
-    json_str = await call_gemini(prompt, "You are a financial data extractor. Output ONLY valid JSON.", json_mode=True)
+async def _analyze_symbol(symbol: str) -> dict:
+    """Extract the raw scoring metrics for a single symbol via Gemini."""
+    # Normalize so "kbank " and "KBANK" share one cached response
+    symbol = symbol.upper().strip()
+    prompt = _ANALYZE_TPL.format(symbol=symbol)
+    json_str = await call_gemini(prompt, "You are a financial data extractor. Output ONLY valid JSON.", json_mode=True, cache=True)
     try:
-        data = json.loads(json_str)
+        data = _parse_json_lenient(json_str)
         return data
-    except:
+    except orjson.JSONDecodeError:
         # Mock Default on Error
-        return {
-            "industry_growth_3yr": 5.0, "net_profit_growth_5yr": 5.0, 
-            "pe_ratio": 15.0, "sector_pe": 15.0,
-            "dividend_yield": 2.0, "dividend_years_consecutive": 5,
-            "company_growth_rate": 5.0, "beta": 1.0
-        }
+        return DEFAULT_METRICS.copy()
+
+@app.post("/api/analyze-stock")
+async def analyze_stock(req: StockAnalysisRequest):
+    return await _analyze_symbol(req.symbol)
+
+async def _analyze_symbol_limited(symbol: str) -> dict:
+    async with _analysis_slots:
+        return await _analyze_symbol(symbol)
+
+@app.post("/api/analyze-portfolio")
+async def analyze_portfolio(req: PortfolioRequest):
+    # Each symbol is an independent Gemini round-trip, so fan them out together (capped by _analysis_slots)
+    results = await asyncio.gather(*[_analyze_symbol_limited(s) for s in req.symbols], return_exceptions=True)
+    return {
+        symbol: (DEFAULT_METRICS.copy() if isinstance(result, Exception) else result)
+        for symbol, result in zip(req.symbols, results)
+    }
+
+@app.post("/api/analyze-stocks")
+async def analyze_stocks(req: PortfolioRequest):
+    symbols = list(dict.fromkeys(s.upper().strip() for s in req.symbols))
+    if not symbols:
+        return {}
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return await analyze_portfolio(PortfolioRequest(symbols=symbols))
+
+    # One multiplexed prompt instead of N round-trips
+    prompt = _MULTI_ANALYZE_TPL.format(symbols=", ".join(symbols))
+    json_str = await call_gemini(prompt, "You are a financial data extractor. Output ONLY valid JSON.",
+                                 json_mode=True, cache=True, fallback=False)
+    if json_str is None:
+        # Gemini itself failed; N more calls would only fail the same way
+        return {s: DEFAULT_METRICS.copy() for s in symbols}
+    try:
+        data = _parse_json_lenient(json_str)
+    except orjson.JSONDecodeError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+
+    # Anything the model skipped or mangled gets its own call
+    missing = [s for s in symbols if not isinstance(data.get(s), dict)]
+    if missing:
+        data.update(await analyze_portfolio(PortfolioRequest(symbols=missing)))
+    return {s: data[s] for s in symbols}
 
 @app.post("/api/calculate-score")
-async def calculate_score_endpoint(req: ScoreRequest):
-    return calculate_master_score(req.metrics, req.weights, req.target_return)
+async def calculate_score_endpoint(req: ScoreRequest) -> dict:
+    # Map the request dicts to positional tuples once, at the boundary
+    m = _metrics_tuple(req.metrics)
+    w = _weights_tuple(req.weights)
+    return _score_result(m, w, req.target_return)
+
+@app.post("/api/calculate-scores")
+async def calculate_scores_endpoint(req: BatchScoreRequest) -> dict:
+    lengths = {len(req.metrics[col]) for col in METRIC_COLUMNS if col in req.metrics}
+    if len(lengths) > 1:
+        raise HTTPException(status_code=422, detail="All metric columns must have the same length")
+    n = lengths.pop() if lengths else 0
+
+    # Missing columns get the same safe defaults as calculate_master_score
+    columns = [req.metrics[col] if col in req.metrics else [default] * n for col, default in zip(METRIC_COLUMNS, _METRIC_DEFAULTS)]
+    return calculate_master_scores_batch(columns, _weights_tuple(req.weights), req.target_return)
 
 @app.post("/api/suggest-weights")
 async def suggest_weights(req: WeightRequest):
@@ -317,45 +633,52 @@ async def suggest_weights(req: WeightRequest):
     # Default recommended weights
     default_weights = {"industry": 15, "profit": 25, "mos": 25, "yield_val": 20, "competition": 15}
     
-    prompt = f"""
-    Acting as Jomo (Investment Strategist), suggest the optimal weighting (Total 100%) for:
-    1. industry (Industry Growth)
-    2. profit (Net Profit Growth)
-    3. mos (Valuation/MOS)
-    4. yield_val (Dividend Yield)
-    5. competition (Competitiveness)
-
-    Context: Project Name "{req.project_name}", Target Return {req.target_return}%.
-    If the project implies dividends, boost yield. If growth, boost industry/profit.
-    
-    Return JSON only: {{"industry": int, "profit": int, "mos": int, "yield_val": int, "competition": int}}
-    """
-    json_str = await call_gemini(prompt, "Output ONLY valid JSON.", json_mode=True)
+    prompt = _WEIGHTS_TPL.format(project_name=req.project_name, target_return=req.target_return)
+    json_str = await call_gemini(prompt, "Output ONLY valid JSON.", json_mode=True, cache=True)
     try:
-        data = json.loads(json_str)
+        data = _parse_json_lenient(json_str)
         return data
-    except:
+    except orjson.JSONDecodeError:
         return default_weights
 
 @app.post("/api/verdict")
 async def generate_verdict(req: VerdictRequest):
-    prompt = f"""Acting as a senior investment analyst, write a concise 2-sentence verdict for {req.symbol}. 
-    Key Data: PE {req.metrics.get('pe_ratio')} (Sector {req.metrics.get('sector_pe')}), Yield {req.metrics.get('dividend_yield')}%. 
-    The model scored it {req.score}/100 (Grade {req.grade}). 
-    Explain why it got this score based on the Master Scoring Model rules."""
+    prompt = _VERDICT_TPL.format(
+        symbol=req.symbol, pe_ratio=req.metrics.get('pe_ratio'), sector_pe=req.metrics.get('sector_pe'),
+        dividend_yield=req.metrics.get('dividend_yield'), score=req.score, grade=req.grade
+    )
     
-    reply = await call_gemini(prompt)
+    reply = await call_gemini(prompt, cache=True)
     return {"verdict": reply}
 
 @app.post("/api/strategy")
 async def generate_strategy(req: StrategyRequest):
-    prompt = f"""Analyze this stock portfolio: [{req.portfolio_summary}]. 
-    Target Return is {req.target_return}%. 
-    Provide a summary of the portfolio's overall quality and 3 concise bullet points for optimization strategy."""
+    prompt = _STRATEGY_TPL.format(portfolio_summary=req.portfolio_summary, target_return=req.target_return)
     
     reply = await call_gemini(prompt)
     return {"strategy": reply}
 
+@app.post("/api/stock-report")
+async def generate_stock_report(req: StockReportRequest):
+    # Phase 1: metrics are needed before anything can be scored
+    metrics = await _analyze_symbol(req.symbol)
+    score = calculate_master_score(metrics, req.weights, req.target_return)
+
+    # Phase 2: verdict and strategy only depend on the score, so run them together
+    summary = req.portfolio_summary or f"{req.symbol} (Score {score['finalScore']}, Grade {score['grade']})"
+    verdict, strategy = await asyncio.gather(
+        generate_verdict(VerdictRequest(symbol=req.symbol, metrics=metrics, score=score["finalScore"], grade=score["grade"])),
+        generate_strategy(StrategyRequest(portfolio_summary=summary, target_return=int(req.target_return))),
+    )
+    return {
+        "metrics": metrics,
+        "score": score,
+        "verdict": verdict["verdict"],
+        "strategy": strategy["strategy"],
+    }
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Workers need an import string; "auto" picks uvloop/httptools from uvicorn[standard] where available
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    uvicorn.run("app:app", host="0.0.0.0", port=port, workers=workers, loop="auto", http="auto")
@@ -1,54 +1,155 @@
 import sqlite3
-import json
+import orjson
+import threading
+from contextlib import contextmanager
+import time
 from typing import List, Dict, Any, Optional
 
 DB_NAME = "jomo.db"
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed while a write is in progress
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
+# One shared connection for the whole process instead of reconnecting per request.
+# Opened by init_db() so importing this module does no disk I/O.
+_conn: Optional[sqlite3.Connection] = None
+_write_lock = threading.Lock()
+
+# Rebuilds the API's project document from the columns, entirely inside SQLite
+_PROJECT_JSON = '''json_object(
+    'id', id,
+    'name', name,
+    'stocks', json(stocks_json),
+    'weights', json(weights_json),
+    'targetReturn', target_return,
+    'chatHistory', json(history_json),
+    'portfolioStrategy', strategy
+)'''
+
+_UPSERT_SQL = '''
+    INSERT OR REPLACE INTO projects
+        (id, name, target_return, updated_at, stocks_json, weights_json, history_json, strategy)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def _project_row(project_data: Dict[str, Any]) -> tuple:
+    # Scalar fields become real columns; only the nested lists/dicts stay JSON
+    return (
+        project_data.get('id'),
+        project_data.get('name'),
+        project_data.get('targetReturn'),
+        time.time_ns() // 1_000_000,
+        orjson.dumps(project_data.get('stocks', [])).decode(),
+        orjson.dumps(project_data.get('weights', {})).decode(),
+        orjson.dumps(project_data.get('chatHistory', [])).decode(),
+        project_data.get('portfolioStrategy'),
+    )
+
+@contextmanager
+def _write_txn():
+    # Every write runs in one transaction together with the version bump
+    with _write_lock:
+        _conn.execute("BEGIN")
+        try:
+            yield
+            _conn.execute("UPDATE projects_version SET version = version + 1")
+            _conn.execute("COMMIT")
+        except Exception:
+            _conn.execute("ROLLBACK")
+            raise
+
 def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    # Create projects table
-    # We store the entire project state as a JSON blob for simplicity
-    # matching the "Document Store" pattern suitable for this SPA.
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS projects (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            data TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def get_all_projects() -> List[Dict[str, Any]]:
-    conn = get_db_connection()
-    projects = conn.execute('SELECT data FROM projects').fetchall()
-    conn.close()
-    return [json.loads(row['data']) for row in projects]
-
-def save_project(project_data: Dict[str, Any]):
-    conn = get_db_connection()
-    project_id = project_data.get('id')
-    name = project_data.get('name')
-    data_json = json.dumps(project_data)
-    
-    conn.execute('''
-        INSERT OR REPLACE INTO projects (id, name, data)
-        VALUES (?, ?, ?)
-    ''', (project_id, name, data_json))
-    conn.commit()
-    conn.close()
+    global _conn
+    if _conn is None:
+        _conn = get_db_connection()
 
-def delete_project(project_id: str):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
-    conn.commit()
-    conn.close()
+    with _write_lock:
+        # IMMEDIATE takes SQLite's write lock before the schema is inspected, so when
+        # several workers start at once only the first one migrates; the rest wait
+        # and then find the new schema already in place
+        _conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = [row['name'] for row in _conn.execute("PRAGMA table_info(projects)")]
+            legacy = 'data' in columns
+            if legacy:
+                # Older databases stored each project as one JSON blob in `data`
+                _conn.execute("ALTER TABLE projects RENAME TO projects_legacy")
+
+            # Hot scalar fields are columns so listing/filtering never parses the JSON parts
+            _conn.execute('''
+                CREATE TABLE IF NOT EXISTS projects (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    target_return REAL,
+                    updated_at INTEGER,
+                    stocks_json TEXT NOT NULL,
+                    weights_json TEXT NOT NULL,
+                    history_json TEXT NOT NULL,
+                    strategy TEXT
+                )
+            ''')
+            _conn.execute("CREATE INDEX IF NOT EXISTS idx_target ON projects(target_return)")
+            # Single-row counter bumped on every write; used as the /api/projects ETag
+            _conn.execute('''
+                CREATE TABLE IF NOT EXISTS projects_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    version INTEGER NOT NULL
+                )
+            ''')
+            _conn.execute("INSERT OR IGNORE INTO projects_version (id, version) VALUES (0, 0)")
 
-# Initialize DB on import
-init_db()
+            if legacy:
+                rows = _conn.execute("SELECT data FROM projects_legacy").fetchall()
+                _conn.executemany(_UPSERT_SQL, [_project_row(orjson.loads(row['data'])) for row in rows])
+                _conn.execute("DROP TABLE projects_legacy")
+            _conn.execute("COMMIT")
+        except Exception:
+            _conn.execute("ROLLBACK")
+            raise
+
+def get_all_projects_raw() -> str:
+    # Let SQLite build the JSON array itself; no per-row parse/re-dump in Python
+    return _conn.execute(
+        f"SELECT COALESCE(json_group_array(json({_PROJECT_JSON})), '[]') FROM projects"
+    ).fetchone()[0]
+
+def list_projects(target_return: Optional[float] = None) -> List[Dict[str, Any]]:
+    # Project list page only needs the scalar columns, never the stocks/history JSON
+    query = 'SELECT id, name, target_return, updated_at FROM projects'
+    params: tuple = ()
+    if target_return is not None:
+        query += ' WHERE target_return = ?'
+        params = (target_return,)
+    rows = _conn.execute(query + ' ORDER BY updated_at DESC', params).fetchall()
+    return [
+        {"id": row['id'], "name": row['name'], "targetReturn": row['target_return'], "updatedAt": row['updated_at']}
+        for row in rows
+    ]
+
+def get_projects_version() -> int:
+    return _conn.execute("SELECT version FROM projects_version").fetchone()[0]
+
+def save_project_raw(project_id: str, name: str, data_json: str):
+    # Takes the already-serialized project document and lets SQLite split out the columns
+    with _write_txn():
+        _conn.execute('''
+            INSERT OR REPLACE INTO projects
+                (id, name, target_return, updated_at, stocks_json, weights_json, history_json, strategy)
+            SELECT :id, :name,
+                json_extract(:data, '$.targetReturn'),
+                :updated_at,
+                json_extract(:data, '$.stocks'),
+                json_extract(:data, '$.weights'),
+                json_extract(:data, '$.chatHistory'),
+                json_extract(:data, '$.portfolioStrategy')
+        ''', {"id": project_id, "name": name, "updated_at": time.time_ns() // 1_000_000, "data": data_json})
+
+def delete_project(project_id: str):
+    with _write_txn():
+        _conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
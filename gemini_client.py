@@ -0,0 +1,46 @@
+import google.generativeai as genai
+import os
+import functools
+
+# Shared Gemini setup for both front-ends (FastAPI app.py and mesop main.py),
+# so a combined deployment configures the SDK once and keeps one set of models.
+
+MODEL_NAME = "gemini-1.5-flash"
+
+generation_config = {
+  "temperature": 1,
+  "top_p": 0.95,
+  "top_k": 64,
+  "max_output_tokens": 8192,
+  "response_mime_type": "text/plain",
+}
+
+_configured = False
+
+def configure():
+    """Configure the SDK once per process; later calls are no-ops"""
+    global _configured
+    if _configured:
+        return
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if api_key:
+        genai.configure(api_key=api_key)
+    _configured = True
+
+@functools.lru_cache(maxsize=32)
+def get_model(system_instruction: str = "", json_mode: bool = False):
+    """Build the GenerativeModel once per (system_instruction, json_mode) and reuse it"""
+    configure()
+    config = {**generation_config, "response_mime_type": "application/json" if json_mode else "text/plain"}
+    return genai.GenerativeModel(
+        model_name=MODEL_NAME,
+        generation_config=config,
+        # The SDK rejects an empty system instruction, so send none at all
+        system_instruction=system_instruction or None,
+    )
+
+async def call(prompt: str, system_instruction: str = "", json_mode: bool = False) -> str:
+    """Single-shot async Gemini call; errors propagate to the caller"""
+    model = get_model(system_instruction, json_mode)
+    response = await model.generate_content_async(prompt)
+    return response.text
@@ -1,21 +1,9 @@
 import mesop as me
-import google.generativeai as genai
-import os
 import typing
+import gemini_client
 
-# Configure Gemini API
-# NOTE: In a real production environment, use os.environ.get("GEMINI_API_KEY")
-api_key = os.environ.get("GOOGLE_API_KEY")
-if api_key:
-    genai.configure(api_key=api_key)
-
-generation_config = {
-  "temperature": 1,
-  "top_p": 0.95,
-  "top_k": 64,
-  "max_output_tokens": 8192,
-  "response_mime_type": "text/plain",
-}
+# Configure Gemini API (shared with app.py via gemini_client)
+gemini_client.configure()
 
 @me.stateclass
 class StockState:
@@ -27,34 +15,30 @@ class StockState:
     is_analyzing: bool = False
     error_message: str = ""
 
-def generate_jomo_analysis(symbol: str) -> str:
-    system_prompt = f"""
+async def generate_jomo_analysis(symbol: str) -> str:
+    system_prompt = """
     คุณคือ 'ผู้ช่วยด้านการลงทุน Jomo'
     หน้าที่:
-    1. หาข้อมูลล่าสุดของหุ้น {symbol} และคู่แข่ง
+    1. หาข้อมูลล่าสุดของหุ้นที่ผู้ใช้ระบุ และคู่แข่ง
     2. กำหนดน้ำหนัก (Weight) ของ 5 ปัจจัย (Total 100%) ตามความเหมาะสมของอุตสาหกรรม
     3. ส่งต่อข้อมูลดิบ (CAGR, PE, Yield, Beta) ให้ StockScorer
     (Keep the tone professional, cite sources if possible.)
     """
     try:
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash", 
-            generation_config=generation_config,
-            system_instruction=system_prompt,
-        )
+        model = gemini_client.get_model(system_prompt)
         chat_session = model.start_chat(history=[])
-        response = chat_session.send_message(f"Analyze stock {symbol}.")
+        response = await chat_session.send_message_async(f"Analyze stock {symbol}.")
         return response.text
     except Exception as e:
         return f"Error in Jomo Analysis: {str(e)}"
 
-def generate_stock_scorer_analysis(jomo_output: str, target_return: float, risk_preference: str) -> str:
-    system_prompt = f"""
+async def generate_stock_scorer_analysis(jomo_output: str, target_return: float, risk_preference: str) -> str:
+    system_prompt = """
     คุณคือ 'StockScorer'
     เป้าหมาย: ประเมินหุ้นตาม 'Master Scoring Model'.
     
     ### ข้อมูลนำเข้า
-    รับข้อมูลมาจาก Jomo และ Target Return = {target_return}%
+    รับข้อมูลมาจาก Jomo และ Target Return ที่ผู้ใช้ระบุ
 
     ### เกณฑ์การให้คะแนน (Base Score 100%)
     1. อุตสาหกรรม (CAGR 3yr): >20%=100, 10-19%=80, 0-9%=60, <0=0
@@ -72,18 +56,14 @@ def generate_stock_scorer_analysis(jomo_output: str, target_return: float, risk_
     สรุปผลเป็นตารางคะแนน, คำนวณ Final Score = Base * Risk Multiplier, และตัดเกรด A(>=80), B(60-79), C(<60).
     """
     try:
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            generation_config=generation_config,
-            system_instruction=system_prompt,
-        )
+        model = gemini_client.get_model(system_prompt)
         chat_session = model.start_chat(history=[])
-        response = chat_session.send_message(f"Here is the analysis from Jomo:\n\n{jomo_output}\n\nPlease evaluate based on the Master Scoring Model and Risk Preference: {risk_preference}.")
+        response = await chat_session.send_message_async(f"Here is the analysis from Jomo:\n\n{jomo_output}\n\nTarget Return = {target_return}%. Please evaluate based on the Master Scoring Model and Risk Preference: {risk_preference}.")
         return response.text
     except Exception as e:
         return f"Error in StockScorer: {str(e)}"
 
-def on_analyze_click(e: me.ClickEvent):
+async def on_analyze_click(e: me.ClickEvent):
     state = me.state(StockState)
     state.is_analyzing = True
     state.jomo_analysis = "Generating Jomo's Strategy... Please wait."
@@ -91,11 +71,11 @@ def on_analyze_click(e: me.ClickEvent):
     state.error_message = ""
     yield 
 
-    jomo_result = generate_jomo_analysis(state.symbol)
+    jomo_result = await generate_jomo_analysis(state.symbol)
     state.jomo_analysis = jomo_result
     yield 
 
-    scorer_result = generate_stock_scorer_analysis(jomo_result, state.target_return, state.risk_preference)
+    scorer_result = await generate_stock_scorer_analysis(jomo_result, state.target_return, state.risk_preference)
     state.stock_scorer_analysis = scorer_result
     state.is_analyzing = False
     yield
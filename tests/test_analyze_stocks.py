@@ -0,0 +1,28 @@
+import asyncio
+
+import app
+
+
+def test_analyze_stocks_returns_default_metrics_when_gemini_is_down(monkeypatch):
+    calls = []
+
+    async def failing_call(prompt, system_instruction="", json_mode=False):
+        calls.append(prompt)
+        raise RuntimeError("Gemini unavailable")
+
+    monkeypatch.setattr(app.gemini_client, "call", failing_call)
+
+    result = asyncio.run(app.analyze_stocks(app.PortfolioRequest(symbols=["kbank", "PTT", "aot "])))
+
+    assert result == {s: app.DEFAULT_METRICS for s in ("KBANK", "PTT", "AOT")}
+    # The failed batch call is not followed by one doomed call per symbol
+    assert len(calls) == 1
+
+
+def test_analyze_stocks_skips_gemini_for_empty_symbols(monkeypatch):
+    async def unexpected_call(prompt, system_instruction="", json_mode=False):
+        raise AssertionError("Gemini should not be called")
+
+    monkeypatch.setattr(app.gemini_client, "call", unexpected_call)
+
+    assert asyncio.run(app.analyze_stocks(app.PortfolioRequest(symbols=[]))) == {}
@@ -0,0 +1,45 @@
+import asyncio
+
+import app
+
+
+def test_followers_retry_when_coalesced_leader_is_cancelled(monkeypatch):
+    calls = []
+
+    async def fake_call(prompt, system_instruction="", json_mode=False):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return f"answer {len(calls)}"
+
+    monkeypatch.setattr(app.gemini_client, "call", fake_call)
+
+    async def scenario():
+        leader = asyncio.create_task(app.call_gemini("same prompt"))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(app.call_gemini("same prompt")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(scenario()) == ["answer 2", "answer 2"]
+    assert len(calls) == 2
+    assert not app._inflight
+
+
+def test_cancelled_follower_does_not_disturb_leader(monkeypatch):
+    async def fake_call(prompt, system_instruction="", json_mode=False):
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    monkeypatch.setattr(app.gemini_client, "call", fake_call)
+
+    async def scenario():
+        leader = asyncio.create_task(app.call_gemini("other prompt"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(app.call_gemini("other prompt"))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        await asyncio.sleep(0)
+        return follower.cancelled(), await leader
+
+    assert asyncio.run(scenario()) == (True, "answer")
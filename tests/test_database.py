@@ -0,0 +1,69 @@
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import database
+
+# Project documents as the original blob schema stored them (json.dumps of ProjectData)
+LEGACY_PROJECTS = [
+    {
+        "id": "p1",
+        "name": "Dividend picks",
+        "stocks": [{"symbol": "PTT", "metrics": {"beta": 0.8, "dividend_yield": 5.5}}],
+        "weights": {"industry": 15, "profit": 25, "mos": 25, "yield_val": 20, "competition": 15},
+        "targetReturn": 8.0,
+        "chatHistory": [{"role": "user", "text": "hello"}],
+        "portfolioStrategy": None,
+    },
+    {
+        "id": "p2",
+        "name": "Growth",
+        "stocks": [],
+        "weights": {},
+        "targetReturn": 15.5,
+        "chatHistory": [],
+        "portfolioStrategy": "Overweight tech",
+    },
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    path = tmp_path / "jomo.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE projects (id TEXT PRIMARY KEY, name TEXT NOT NULL, data TEXT NOT NULL)")
+    conn.executemany(
+        "INSERT INTO projects (id, name, data) VALUES (?, ?, ?)",
+        [(p["id"], p["name"], json.dumps(p)) for p in LEGACY_PROJECTS],
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(database, "DB_NAME", str(path))
+    monkeypatch.setattr(database, "_conn", None)
+    yield path
+    if database._conn is not None:
+        database._conn.close()
+
+
+def test_legacy_blobs_migrate_without_changing_api_output(legacy_db):
+    with TestClient(app.app) as client:
+        response = client.get("/api/projects")
+
+    assert response.status_code == 200
+    assert response.json() == LEGACY_PROJECTS
+
+    columns = [row["name"] for row in database._conn.execute("PRAGMA table_info(projects)")]
+    assert "data" not in columns
+    tables = {row["name"] for row in database._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "projects_legacy" not in tables
+
+
+def test_init_db_is_idempotent_after_migration(legacy_db):
+    database.init_db()
+    database.init_db()
+
+    assert json.loads(database.get_all_projects_raw()) == LEGACY_PROJECTS
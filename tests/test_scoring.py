@@ -0,0 +1,182 @@
+import json
+import math
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+WEIGHTS = {"industry": 15, "profit": 25, "mos": 25, "yield_val": 20, "competition": 15}
+
+
+def reference_score(metrics, weights, target_return):
+    """The original if/elif Master Scoring Model, kept verbatim as the oracle for the compiled core"""
+    ind_growth = metrics.get("industry_growth_3yr", 0)
+    prof_growth = metrics.get("net_profit_growth_5yr", 0)
+    stock_pe = metrics.get("pe_ratio", 0)
+    sect_pe = metrics.get("sector_pe", 0)
+    div_yield = metrics.get("dividend_yield", 0)
+    div_years = metrics.get("dividend_years_consecutive", 0)
+    comp_growth = metrics.get("company_growth_rate", 0)
+    beta = metrics.get("beta", 1.0)
+
+    raw = {}
+    if ind_growth >= 20: raw["industry"] = 100
+    elif ind_growth >= 10: raw["industry"] = 80
+    elif ind_growth >= 0: raw["industry"] = 60
+    else: raw["industry"] = 0
+
+    if prof_growth >= 20: raw["profit"] = 100
+    elif prof_growth >= 10: raw["profit"] = 80
+    elif prof_growth >= 5: raw["profit"] = 60
+    elif prof_growth >= 0: raw["profit"] = 40
+    else: raw["profit"] = 0
+
+    if sect_pe > 0:
+        mos_pct = (sect_pe - stock_pe) / sect_pe
+        if mos_pct > 0.20: raw["mos"] = 100
+        elif mos_pct >= 0.10: raw["mos"] = 80
+        elif mos_pct >= -0.10: raw["mos"] = 50
+        else: raw["mos"] = 0
+    else:
+        raw["mos"] = 50 if 0 < stock_pe < 20 else 0
+
+    if div_years < 5: raw["yield"] = 0
+    elif div_yield >= 8: raw["yield"] = 100
+    elif div_yield >= 5: raw["yield"] = 80
+    elif div_yield >= 3: raw["yield"] = 60
+    else: raw["yield"] = 30
+
+    diff = comp_growth - ind_growth
+    if diff >= 15: raw["competition"] = 100
+    elif diff >= 5: raw["competition"] = 80
+    elif diff >= -5: raw["competition"] = 50
+    else: raw["competition"] = 20
+
+    base_score = (
+        raw["industry"] * weights.get("industry", 15) +
+        raw["profit"] * weights.get("profit", 25) +
+        raw["mos"] * weights.get("mos", 25) +
+        raw["yield"] * weights.get("yield_val", 20) +
+        raw["competition"] * weights.get("competition", 15)
+    ) / 100.0
+
+    if target_return < 10:
+        if beta < 0.8: risk_mult = 1.0
+        elif beta <= 1.2: risk_mult = 0.9
+        else: risk_mult = 0.5
+    elif target_return >= 15:
+        if 1.2 <= beta <= 2.5: risk_mult = 1.0
+        elif 0.9 <= beta < 1.2: risk_mult = 0.9
+        else: risk_mult = 0.6
+    else:
+        risk_mult = 1.0 if 0.7 <= beta <= 1.5 else 0.8
+
+    final_score = base_score * risk_mult
+    grade = "A" if final_score >= 80 else "B" if final_score >= 60 else "C"
+    return {
+        "baseScore": round(base_score, 1),
+        "finalScore": int(final_score),
+        "grade": grade,
+        "riskMult": risk_mult,
+        "rawScores": raw,
+    }
+
+
+def random_metrics(rng):
+    return {
+        "industry_growth_3yr": rng.uniform(-10, 30),
+        "net_profit_growth_5yr": rng.uniform(-10, 30),
+        "pe_ratio": rng.uniform(-5, 40),
+        "sector_pe": rng.choice([0, rng.uniform(5, 40)]),
+        "dividend_yield": rng.uniform(0, 10),
+        "dividend_years_consecutive": rng.randint(0, 10),
+        "company_growth_rate": rng.uniform(-20, 40),
+        "beta": rng.uniform(0, 3),
+    }
+
+
+def to_columns(rows):
+    return {col: [row[col] for row in rows] for col in app.METRIC_COLUMNS}
+
+
+def looped(rows, weights, target_return):
+    scores = [app.calculate_master_score(row, weights, target_return) for row in rows]
+    return {
+        "baseScore": [s["baseScore"] for s in scores],
+        "finalScore": [s["finalScore"] for s in scores],
+        "grade": [s["grade"] for s in scores],
+        "riskMult": [s["riskMult"] for s in scores],
+        "rawScores": {key: [s["rawScores"][key] for s in scores] for key in scores[0]["rawScores"]},
+    }
+
+
+BOUNDARY_METRICS = [
+    {"industry_growth_3yr": v, "company_growth_rate": v + d}
+    for v in (-0.01, 0, 9.99, 10, 19.99, 20) for d in (-5.01, -5, 4.99, 5, 14.99, 15)
+] + [
+    {"net_profit_growth_5yr": v} for v in (-0.01, 0, 4.99, 5, 9.99, 10, 19.99, 20)
+] + [
+    # MOS of exactly -10%, 10% and 20% (strict), then just past 20%
+    {"pe_ratio": pe, "sector_pe": 10} for pe in (11, 11.01, 9, 8, 7.99)
+] + [
+    {"pe_ratio": pe, "sector_pe": 0} for pe in (0, 19.99, 20)
+] + [
+    {"dividend_yield": y, "dividend_years_consecutive": years}
+    for y in (2.99, 3, 4.99, 5, 7.99, 8) for years in (4, 5)
+] + [
+    {"beta": b} for b in (0.69, 0.7, 0.79, 0.8, 0.89, 0.9, 1.19, 1.2, 1.5, 1.51, 2.5, 2.51)
+]
+
+
+# 1e999 is valid JSON for +inf; NaN must score like the >= chains did (lowest bucket)
+NON_FINITE_METRICS = [
+    {key: value} for key in app.METRIC_COLUMNS for value in (math.inf, -math.inf, math.nan)
+] + [
+    {"pe_ratio": math.inf, "sector_pe": math.inf},
+    {"industry_growth_3yr": math.inf, "company_growth_rate": math.inf},
+]
+
+
+@pytest.mark.parametrize("target_return", [9.99, 10, 14.99, 15])
+@pytest.mark.parametrize("metrics", BOUNDARY_METRICS + NON_FINITE_METRICS)
+def test_score_matches_reference_on_bucket_boundaries(metrics, target_return):
+    assert app.calculate_master_score(metrics, WEIGHTS, target_return) == reference_score(metrics, WEIGHTS, target_return)
+
+
+def test_score_matches_reference_on_random_metrics():
+    rng = random.Random(1234)
+    for _ in range(30_000):
+        metrics = random_metrics(rng)
+        weights = {key: rng.randint(0, 40) for key in WEIGHTS}
+        target_return = rng.choice([5, 10, 12, 15, 20])
+        assert app.calculate_master_score(metrics, weights, target_return) == reference_score(metrics, weights, target_return)
+
+
+@pytest.mark.parametrize("rows", [10, 100])
+@pytest.mark.parametrize("target_return", [5, 12, 20])
+def test_batch_endpoint_matches_scalar_loop(rows, target_return):
+    # 10 rows takes the per-row compiled path, 100 the vectorized one (see _VECTORIZE_MIN_ROWS)
+    rng = random.Random(rows)
+    boundary = [{**dict.fromkeys(app.METRIC_COLUMNS, 0), "beta": 1.0, **m} for m in NON_FINITE_METRICS + BOUNDARY_METRICS]
+    metrics = rng.sample(boundary, rows // 2) + [random_metrics(rng) for _ in range(rows - rows // 2)]
+
+    response = TestClient(app.app).post(
+        "/api/calculate-scores",
+        # Encoded by hand because httpx refuses NaN/Infinity; the server's JSON parser accepts them
+        content=json.dumps({"metrics": to_columns(metrics), "weights": WEIGHTS, "target_return": target_return}),
+        headers={"Content-Type": "application/json"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == looped(metrics, WEIGHTS, target_return)
+
+
+def test_batch_endpoint_rejects_unequal_columns():
+    response = TestClient(app.app).post(
+        "/api/calculate-scores",
+        json={"metrics": {"pe_ratio": [10, 12], "beta": [1.0]}, "weights": {}, "target_return": 10},
+    )
+
+    assert response.status_code == 422